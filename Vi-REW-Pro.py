@@ -7,7 +7,7 @@ from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QFrame,
     QHBoxLayout, QVBoxLayout, QPushButton, QCheckBox, 
     QFileDialog, QStyle, QMessageBox, QProgressBar,
-    QSlider, QGroupBox, QSizePolicy
+    QSlider, QGroupBox, QSizePolicy, QComboBox
 )
 from PySide6.QtCore import Qt, QThread, QObject, Signal, Slot, QTimer
 from PySide6.QtGui import QImage, QPixmap, QKeySequence, QShortcut
@@ -17,6 +17,9 @@ from moviepy.editor import VideoFileClip, concatenate_videoclips, vfx
 import imageio_ffmpeg 
 from proglog import ProgressBarLogger 
 
+import rew_engine
+import rew_planner
+
 # --- [UI Logger] ---
 class QtLogger(ProgressBarLogger):
     def __init__(self, progress_signal, message_signal):
@@ -44,13 +47,45 @@ class VideoReverseWorker(QObject):
     progress_msg = Signal(str)  
     progress_val = Signal(int)  
 
-    def __init__(self, file_path, is_boomerang, start_frame, end_frame, fps):
+    def __init__(self, file_path, is_boomerang, start_frame, end_frame, fps,
+                 strategy="moviepy", segment_frames=None, has_audio=True, output_format="mp4",
+                 speed=1.0, ease="linear"):
         super().__init__()
         self.file_path = file_path
         self.is_boomerang = is_boomerang
         self.start_frame = start_frame
         self.end_frame = end_frame
         self.fps = fps
+        self.strategy = strategy
+        self.segment_frames = segment_frames or rew_engine.DEFAULT_SEGMENT_FRAMES
+        self.has_audio = has_audio
+        self.output_format = output_format
+        self.speed = speed
+        self.ease = ease
+
+    def output_path(self):
+        base_name = os.path.splitext(self.file_path)[0]
+        suffix = "_boomerang" if self.is_boomerang else "_REW"
+        return base_name + suffix + rew_engine.OUTPUT_EXTENSIONS[self.output_format]
+
+    def run_engine(self, target_codec, target_preset, target_params):
+        # 串流引擎：直接以 YUV 分段倒轉寫檔，不經過 MoviePy；音訊先倒轉再於同一次編碼中合併
+        mode = "boomerang" if self.is_boomerang else "reverse"
+        output_path = self.output_path()
+
+        self.progress_msg.emit(f"輸出影片 ({rew_planner.STRATEGY_LABELS[self.strategy]})...")
+        # end_frame 與 MoviePy 流程相同，不含終點那一幀
+        rew_engine.reverse_file(
+            self.file_path, output_path, mode, self.start_frame, self.end_frame - 1,
+            segment_frames=self.segment_frames,
+            progress=lambda done, total: self.progress_val.emit(int(done * 100 / total)),
+            speed=self.speed, ease=self.ease,
+            # 變速輸出不含音訊
+            with_audio=self.has_audio and self.speed == 1 and self.ease == "linear",
+            output_format=self.output_format,
+            codec=target_codec, preset=target_preset, ffmpeg_params=target_params
+        )
+        return output_path
 
     @Slot()
     def run(self):
@@ -74,18 +109,22 @@ class VideoReverseWorker(QObject):
             
             # --- [修正] 移除不穩定的硬體偵測，改用最穩定的通用設定 ---
             # 這是 Windows 相容性最好、且絕不會因為驅動程式報錯的設定
-            target_codec = "libx264"
-            target_preset = "ultrafast" # 速度優先
-            target_params = ['-crf', '18', '-pix_fmt', 'yuv420p']
+            target_codec, target_preset, target_params = rew_engine.encoder_settings(None)  # libx264 ultrafast
 
             self.progress_msg.emit("讀取原始影片...")
             if not os.path.exists(self.file_path):
                 raise FileNotFoundError(f"找不到檔案: {self.file_path}")
 
-            original_clip = VideoFileClip(self.file_path)
-            
             # 轉換幀數為秒數 (加強除錯保護)
             if self.fps <= 0: self.fps = 30.0
+
+            if self.strategy != "moviepy":
+                output_path = self.run_engine(target_codec, target_preset, target_params)
+                self.progress_val.emit(100)
+                self.finished.emit(output_path)
+                return
+
+            original_clip = VideoFileClip(self.file_path)
             
             s_time = self.start_frame / self.fps
             e_time = self.end_frame / self.fps
@@ -108,12 +147,14 @@ class VideoReverseWorker(QObject):
             my_logger = QtLogger(self.progress_val, self.progress_msg)
 
             # 統一寫入函式
-            def write_clip(clip, path):
+            # final=True 時套用輸出格式 (分段 MP4 / HLS)，暫存檔維持一般 MP4
+            def write_clip(clip, path, final=False):
                 clip.write_videofile(
                     path, codec=target_codec, audio_codec="aac",
                     temp_audiofile=temp_audio_name, remove_temp=True,
                     threads=cpu_cores, preset=target_preset,
-                    ffmpeg_params=target_params, logger=my_logger
+                    ffmpeg_params=target_params + (rew_engine.container_params(self.output_format, path) if final else []),
+                    logger=my_logger
                 )
 
             if self.is_boomerang:
@@ -126,13 +167,13 @@ class VideoReverseWorker(QObject):
                 self.progress_msg.emit("合併 正向+倒轉...")
                 final_clip = concatenate_videoclips([trimmed_clip, rev_clip_disk])
                 
-                output_path = base_name + "_boomerang.mp4"
-                write_clip(final_clip, output_path)
+                output_path = self.output_path()
+                write_clip(final_clip, output_path, final=True)
                 rev_clip_disk.close()
             else:
-                output_path = base_name + "_REW.mp4"
+                output_path = self.output_path()
                 self.progress_msg.emit("輸出倒轉影片...")
-                write_clip(reversed_clip, output_path)
+                write_clip(reversed_clip, output_path, final=True)
 
             # 資源清理
             if original_clip: original_clip.close()
@@ -157,6 +198,25 @@ class VideoReverseWorker(QObject):
                 if original_clip: original_clip.close()
             except: pass
 
+# --- 預估工作 (探測來源 + 實測本機速度) ---
+class PlanWorker(QObject):
+    finished = Signal(str, object, object)
+    error = Signal(str, str)
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+
+    @Slot()
+    def run(self):
+        try:
+            info = rew_planner.probe(self.file_path)
+            # 與 VideoReverseWorker 相同，固定以 CPU 編碼器實測
+            speeds = rew_planner.measure_speed(info, *rew_engine.encoder_settings(None))
+            self.finished.emit(self.file_path, info, speeds)
+        except Exception as e:
+            self.error.emit(self.file_path, f"無法預估: {str(e)}")
+
 # --- UI 部分 ---
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -173,11 +233,23 @@ class MainWindow(QMainWindow):
         self.current_frame_idx = 0
         self.start_frame = 0
         self.end_frame = 0
+
+        # 預覽快取：最後解碼的影格與重複使用的縮放/色彩轉換緩衝區
+        self.last_frame = None
+        self.last_frame_idx = -1
+        self.scaled_buf = None
+        self.rgb_buf = None
         
         # 播放控制
         self.is_playing = False
         self.play_timer = QTimer()
         self.play_timer.timeout.connect(self.next_frame_slot)
+
+        # 工作規劃
+        self.source_info = None
+        self.speed_info = None
+        self.plan = None
+        self.plan_jobs = []
         
         self.setup_ui()
 
@@ -293,8 +365,45 @@ class MainWindow(QMainWindow):
 
         # 4. 輸出選項
         self.boomerang_check = QCheckBox("啟用 Boomerang 效果 (正向+倒轉)")
+        self.boomerang_check.toggled.connect(lambda checked: self.update_plan())
         layout.addWidget(self.boomerang_check)
 
+        # 變速 (僅串流引擎，輸出不含音訊)
+        speed_layout = QHBoxLayout()
+        speed_layout.addWidget(QLabel("速度:"))
+        self.speed_combo = QComboBox()
+        for speed in (1, 2, 4):
+            self.speed_combo.addItem(f"{speed}x", float(speed))
+        self.speed_combo.setToolTip("變速輸出使用串流引擎，且不含音訊")
+        self.speed_combo.currentIndexChanged.connect(lambda index: self.update_plan())
+        speed_layout.addWidget(self.speed_combo)
+        speed_layout.addWidget(QLabel("曲線:"))
+        self.ease_combo = QComboBox()
+        for ease, label in rew_engine.EASING_LABELS.items():
+            self.ease_combo.addItem(label, ease)
+        self.ease_combo.currentIndexChanged.connect(lambda index: self.update_plan())
+        speed_layout.addWidget(self.ease_combo)
+        speed_layout.addStretch()
+        layout.addLayout(speed_layout)
+
+        # 5. 處理策略 (預估時間/記憶體，可手動覆寫)
+        plan_group = QGroupBox("處理策略")
+        p_layout = QVBoxLayout(plan_group)
+        self.strategy_combo = QComboBox()
+        self.strategy_combo.addItem("自動", None)
+        for strategy in rew_planner.STRATEGIES:
+            self.strategy_combo.addItem(rew_planner.STRATEGY_LABELS[strategy], strategy)
+        p_layout.addWidget(self.strategy_combo)
+        self.format_combo = QComboBox()
+        for output_format in rew_engine.OUTPUT_FORMATS:
+            self.format_combo.addItem(rew_engine.OUTPUT_FORMAT_LABELS[output_format], output_format)
+        self.format_combo.setToolTip("分段 MP4 / HLS 會邊編碼邊寫出，中斷時已完成的片段仍可播放")
+        p_layout.addWidget(self.format_combo)
+        self.plan_label = QLabel("載入影片後顯示預估")
+        self.plan_label.setStyleSheet("color: #AAA; font-family: Consolas, monospace;")
+        p_layout.addWidget(self.plan_label)
+        layout.addWidget(plan_group)
+
         main_btn_layout = QHBoxLayout()
         self.select_btn = QPushButton("開啟檔案")
         self.select_btn.clicked.connect(self.select_file)
@@ -332,6 +441,8 @@ class MainWindow(QMainWindow):
         if self.is_playing: self.toggle_playback()
 
         self.cap = cv2.VideoCapture(path)
+        self.last_frame = None
+        self.last_frame_idx = -1
         if not self.cap.isOpened():
             self.status_label.setText("無法開啟影片")
             return
@@ -356,6 +467,52 @@ class MainWindow(QMainWindow):
         
         self.seek_video(0)
         self.status_label.setText(f"已載入: {os.path.basename(path)}")
+        self.start_planning(path)
+
+    def start_planning(self, path):
+        self.source_info = None
+        self.speed_info = None
+        self.plan = None
+        self.strategy_combo.setItemText(0, "自動")
+        self.plan_label.setText("分析影片中...")
+
+        # 保留仍在執行的預估工作，避免執行緒被提早回收
+        self.plan_jobs = [(t, w) for t, w in self.plan_jobs if t.isRunning()]
+        thread = QThread(self)
+        worker = PlanWorker(path)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(self.on_plan_ready)
+        worker.error.connect(self.on_plan_error)
+        worker.finished.connect(thread.quit)
+        worker.error.connect(thread.quit)
+        self.plan_jobs.append((thread, worker))
+        thread.start()
+
+    @Slot(str, str)
+    def on_plan_error(self, path, message):
+        if path != self.current_file_path: return  # 已換了其他影片
+        self.plan_label.setText(message)
+
+    @Slot(str, object, object)
+    def on_plan_ready(self, path, info, speeds):
+        if path != self.current_file_path: return  # 已換了其他影片
+        self.source_info = info
+        self.speed_info = speeds
+        self.update_plan()
+
+    def update_plan(self):
+        if not self.source_info: return
+        mode = "boomerang" if self.boomerang_check.isChecked() else "reverse"
+        strategies = rew_planner.ENGINE_STRATEGIES if self.is_variable_speed() else rew_planner.STRATEGIES
+        self.plan = rew_planner.plan_job(self.source_info, self.speed_info,
+                                         self.start_frame, self.end_frame - 1, mode,
+                                         self.speed_combo.currentData(), strategies)
+        self.strategy_combo.setItemText(0, f"自動 (建議: {rew_planner.STRATEGY_LABELS[self.plan.choice]})")
+        self.plan_label.setText(self.plan.summary())
+
+    def is_variable_speed(self):
+        return self.speed_combo.currentData() != 1 or self.ease_combo.currentData() != "linear"
 
     def toggle_playback(self):
         if not self.cap: return
@@ -391,26 +548,45 @@ class MainWindow(QMainWindow):
     def seek_video(self, frame_idx):
         if not self.cap: return
         self.current_frame_idx = frame_idx
-        
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        ret, frame = self.cap.read()
-        
+
+        # 同一幀不重複解碼；下一幀直接往下讀，避免 seek
+        if frame_idx != self.last_frame_idx or self.last_frame is None:
+            if self.last_frame_idx < 0 or frame_idx != self.last_frame_idx + 1:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            ret = self.cap.grab()
+            # 解碼到同一塊記憶體，不每幀配置新陣列
+            if ret: ret, self.last_frame = self.cap.retrieve(self.last_frame)
+            self.last_frame_idx = frame_idx if ret else -1
+        else:
+            ret = True
+
         if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = frame.shape
-            bytes_per_line = ch * w
-            q_img = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            
-            scaled_pixmap = QPixmap.fromImage(q_img).scaled(
-                self.preview_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
-            )
-            self.preview_label.setPixmap(scaled_pixmap)
+            self.render_preview()
             
             seconds = frame_idx / self.fps
             time_str = f"{int(seconds//3600):02}:{int((seconds%3600)//60):02}:{seconds%60:05.2f}"
             self.time_label.setText(time_str)
             self.frame_label.setText(f"Frame: {frame_idx} / {self.total_frames}")
 
+    def render_preview(self):
+        if self.last_frame is None: return
+        h, w = self.last_frame.shape[:2]
+        label_w, label_h = self.preview_label.width(), self.preview_label.height()
+        scale = min(label_w / w, label_h / h)
+        tw, th = max(1, int(w * scale)), max(1, int(h * scale))
+
+        # 尺寸改變時才重新配置緩衝區
+        if self.scaled_buf is None or self.scaled_buf.shape[:2] != (th, tw):
+            self.scaled_buf = np.empty((th, tw, 3), dtype=np.uint8)
+            self.rgb_buf = np.empty((th, tw, 3), dtype=np.uint8)
+
+        # 先在 OpenCV 縮放到顯示尺寸，再只對小圖做色彩轉換
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        cv2.resize(self.last_frame, (tw, th), dst=self.scaled_buf, interpolation=interpolation)
+        cv2.cvtColor(self.scaled_buf, cv2.COLOR_BGR2RGB, dst=self.rgb_buf)
+        q_img = QImage(self.rgb_buf.data, tw, th, 3 * tw, QImage.Format_RGB888)
+        self.preview_label.setPixmap(QPixmap.fromImage(q_img))
+
     def step_frame(self, step):
         if not self.cap: return
         if self.is_playing: self.toggle_playback()
@@ -439,10 +615,16 @@ class MainWindow(QMainWindow):
         self.range_info.setText(
             f"循環/輸出區間: {self.start_frame}f -> {self.end_frame}f (長度: {duration_sec:.2f}s)"
         )
+        self.update_plan()
 
     def start_processing(self):
         if self.is_playing: self.toggle_playback()
         
+        # 手動選擇優先，其次為自動建議；預估尚未完成時沿用原本的 MoviePy 流程
+        strategy = self.strategy_combo.currentData() or (self.plan.choice if self.plan else "moviepy")
+        # MoviePy 流程不支援變速，改用分段串流
+        if self.is_variable_speed() and strategy not in rew_planner.ENGINE_STRATEGIES: strategy = "segmented"
+        
         self.lock_ui(True)
         self.thread = QThread()
         self.worker = VideoReverseWorker(
@@ -450,7 +632,13 @@ class MainWindow(QMainWindow):
             self.boomerang_check.isChecked(),
             self.start_frame,
             self.end_frame,
-            self.fps
+            self.fps,
+            strategy,
+            self.plan.segment_frames(strategy) if self.plan else None,
+            self.source_info.has_audio if self.source_info else True,  # 預估未完成時由引擎自行偵測音訊
+            self.format_combo.currentData(),
+            self.speed_combo.currentData(),
+            self.ease_combo.currentData()
         )
         self.worker.moveToThread(self.thread)
         self.thread.started.connect(self.worker.run)
@@ -470,6 +658,11 @@ class MainWindow(QMainWindow):
         self.play_btn.setEnabled(not locked)
         self.btn_set_in.setEnabled(not locked)
         self.btn_set_out.setEnabled(not locked)
+        self.boomerang_check.setEnabled(not locked)
+        self.strategy_combo.setEnabled(not locked)
+        self.format_combo.setEnabled(not locked)
+        self.speed_combo.setEnabled(not locked)
+        self.ease_combo.setEnabled(not locked)
         self.setAcceptDrops(not locked)
 
     @Slot(str)
@@ -486,9 +679,17 @@ class MainWindow(QMainWindow):
         self.status_label.setText("發生錯誤")
     
     def resizeEvent(self, event):
-        if self.cap: self.seek_video(self.current_frame_idx)
+        # 只用快取的影格重新縮放，不重新解碼
+        if self.cap: self.render_preview()
         super().resizeEvent(event)
 
+    def closeEvent(self, event):
+        # 等待預估工作結束，避免執行中的 QThread 隨視窗一起被銷毀
+        for thread, worker in self.plan_jobs:
+            thread.quit()
+            thread.wait()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     import multiprocessing
     multiprocessing.freeze_support() # 防止 PyInstaller 多工錯誤
@@ -1,10 +1,9 @@
 import sys
 import os
-import subprocess
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QFrame,
     QHBoxLayout, QVBoxLayout, QPushButton, QCheckBox, 
-    QFileDialog, QStyle, QMessageBox, QProgressBar
+    QFileDialog, QStyle, QMessageBox, QProgressBar, QComboBox
 )
 from PySide6.QtCore import Qt, QThread, QObject, Signal, Slot
 from PySide6.QtGui import QColor, QIcon
@@ -15,6 +14,9 @@ from moviepy.editor import VideoFileClip, concatenate_videoclips, vfx
 import imageio_ffmpeg 
 from proglog import ProgressBarLogger 
 
+import rew_engine
+import rew_planner
+
 # --- [UI Logger] ---
 class QtLogger(ProgressBarLogger):
     def __init__(self, progress_signal, message_signal):
@@ -40,22 +42,40 @@ class VideoReverseWorker(QObject):
     progress_msg = Signal(str)  
     progress_val = Signal(int)  
 
-    def __init__(self, file_path, is_boomerang):
+    def __init__(self, file_path, is_boomerang, strategy="moviepy", segment_frames=None, has_audio=True,
+                 output_format="mp4", speed=1.0, ease="linear"):
         super().__init__()
         self.file_path = file_path
         self.is_boomerang = is_boomerang
-
-    def detect_hardware_encoder(self, ffmpeg_path):
-        if not ffmpeg_path: return None
-        try:
-            result = subprocess.run([ffmpeg_path, "-encoders"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            output = result.stdout
-            if "h264_nvenc" in output: return "nvidia"
-            elif "h264_amf" in output: return "amd"
-            elif "h264_qsv" in output: return "intel"
-        except Exception:
-            return None
-        return None
+        self.strategy = strategy
+        self.segment_frames = segment_frames or rew_engine.DEFAULT_SEGMENT_FRAMES
+        self.has_audio = has_audio
+        self.output_format = output_format
+        self.speed = speed
+        self.ease = ease
+
+    def output_path(self):
+        base_name = os.path.splitext(self.file_path)[0]
+        suffix = "_boomerang" if self.is_boomerang else "_REW"
+        return base_name + suffix + rew_engine.OUTPUT_EXTENSIONS[self.output_format]
+
+    def run_engine(self, target_codec, target_preset, target_params):
+        # 串流引擎：直接以 YUV 分段倒轉寫檔，不經過 MoviePy；音訊先倒轉再於同一次編碼中合併
+        mode = "boomerang" if self.is_boomerang else "reverse"
+        output_path = self.output_path()
+
+        self.progress_msg.emit(f"輸出影片 ({rew_planner.STRATEGY_LABELS[self.strategy]})...")
+        rew_engine.reverse_file(
+            self.file_path, output_path, mode,
+            segment_frames=self.segment_frames,
+            progress=lambda done, total: self.progress_val.emit(int(done * 100 / total)),
+            speed=self.speed, ease=self.ease,
+            # 變速輸出不含音訊
+            with_audio=self.has_audio and self.speed == 1 and self.ease == "linear",
+            output_format=self.output_format,
+            codec=target_codec, preset=target_preset, ffmpeg_params=target_params
+        )
+        return output_path
 
     @Slot()
     def run(self):
@@ -75,39 +95,26 @@ class VideoReverseWorker(QObject):
             
             cpu_cores = os.cpu_count() or 4
             
-            # --- 硬體參數設定 ---
-            gpu_type = self.detect_hardware_encoder(ffmpeg_path)
-            
-            target_codec = ""
-            target_preset = ""
-            target_params = []
+            # --- 硬體參數設定 (與預估共用 rew_engine 的偵測結果與參數) ---
+            gpu_type = rew_engine.detect_hardware_encoder(ffmpeg_path)
+            target_codec, target_preset, target_params = rew_engine.encoder_settings(gpu_type)
 
-            # [關鍵參數修正] 確保 Windows 可播放 (-pix_fmt yuv420p)
             if gpu_type == "nvidia":
                 self.progress_msg.emit("NVIDIA 極速模式 (P1)")
                 print("[系統訊息] 模式: NVIDIA NVENC P1")
-                target_codec = "h264_nvenc"
-                target_preset = "p1" 
-                target_params = ['-rc', 'constqp', '-qp', '18', '-zerolatency', '1', '-pix_fmt', 'yuv420p']
-
             elif gpu_type == "amd":
                 self.progress_msg.emit("AMD 極速模式")
-                target_codec = "h264_amf"
-                target_preset = "speed"
-                target_params = ['-rc', 'cqp', '-qp_p', '18', '-qp_i', '18', '-usage', 'ultralowlatency', '-pix_fmt', 'yuv420p']
-
             elif gpu_type == "intel":
                 self.progress_msg.emit("Intel QSV 極速模式")
-                target_codec = "h264_qsv"
-                target_preset = "veryfast"
-                target_params = ['-global_quality', '18', '-pix_fmt', 'yuv420p']
-
             else:
                 self.progress_msg.emit("CPU 極速模式 (Ultrafast)")
                 print("[系統訊息] 模式: CPU Ultrafast")
-                target_codec = "libx264"
-                target_preset = "ultrafast" 
-                target_params = ['-crf', '18', '-pix_fmt', 'yuv420p'] 
+
+            if self.strategy != "moviepy":
+                output_path = self.run_engine(target_codec, target_preset, target_params)
+                self.progress_val.emit(100)
+                self.finished.emit(output_path)
+                return
 
             # --- 處理流程 ---
             self.progress_msg.emit("載入影片...")
@@ -127,7 +134,8 @@ class VideoReverseWorker(QObject):
             my_logger = QtLogger(self.progress_val, self.progress_msg)
 
             # 統一寫入函式
-            def write_clip(clip, path):
+            # final=True 時套用輸出格式 (分段 MP4 / HLS)，暫存檔維持一般 MP4
+            def write_clip(clip, path, final=False):
                 clip.write_videofile(
                     path, 
                     codec=target_codec, 
@@ -136,7 +144,7 @@ class VideoReverseWorker(QObject):
                     remove_temp=True,
                     threads=cpu_cores,
                     preset=target_preset,
-                    ffmpeg_params=target_params,
+                    ffmpeg_params=target_params + (rew_engine.container_params(self.output_format, path) if final else []),
                     logger=my_logger
                 )
 
@@ -151,15 +159,15 @@ class VideoReverseWorker(QObject):
                 self.progress_msg.emit("合併並輸出 (UltraFast)...")
                 final_clip = concatenate_videoclips([original_clip, rev_clip_disk])
                 
-                output_path = base_name + "_boomerang.mp4"
-                write_clip(final_clip, output_path)
+                output_path = self.output_path()
+                write_clip(final_clip, output_path, final=True)
                 
                 rev_clip_disk.close()
                 
             else:
-                output_path = base_name + "_REW.mp4"
+                output_path = self.output_path()
                 self.progress_msg.emit("輸出倒轉影片 (UltraFast)...")
-                write_clip(reversed_clip, output_path)
+                write_clip(reversed_clip, output_path, final=True)
 
             # 清理
             if original_clip: original_clip.close()
@@ -183,7 +191,27 @@ class VideoReverseWorker(QObject):
                 if original_clip: original_clip.close()
             except: pass
 
-# --- UI 部分 (保持不變) ---
+# --- 預估工作 (探測來源 + 實測本機速度) ---
+class PlanWorker(QObject):
+    finished = Signal(str, object, object)
+    error = Signal(str, str)
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+
+    @Slot()
+    def run(self):
+        try:
+            info = rew_planner.probe(self.file_path)
+            # 以實際處理時會使用的編碼器實測速度
+            codec, preset, params = rew_engine.encoder_settings(rew_engine.detect_hardware_encoder())
+            speeds = rew_planner.measure_speed(info, codec, preset, params)
+            self.finished.emit(self.file_path, info, speeds)
+        except Exception as e:
+            self.error.emit(self.file_path, f"無法預估: {str(e)}")
+
+# --- UI 部分 ---
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -194,6 +222,10 @@ class MainWindow(QMainWindow):
         self.thread = None
         self.worker = None
         self.current_file_path = None
+        self.source_info = None
+        self.speed_info = None
+        self.plan = None
+        self.plan_jobs = []
         self.setup_ui()
 
     def setup_ui(self):
@@ -238,10 +270,36 @@ class MainWindow(QMainWindow):
         options_layout = QHBoxLayout()
         self.boomerang_check = QCheckBox("串接原檔 (Boomerang 效果)")
         self.boomerang_check.setChecked(False) 
+        self.boomerang_check.toggled.connect(lambda checked: self.update_plan())
         options_layout.addWidget(self.boomerang_check)
+        # 變速 (僅串流引擎，輸出不含音訊)
+        self.speed_combo = QComboBox()
+        for speed in (1, 2, 4):
+            self.speed_combo.addItem(f"{speed}x", float(speed))
+        self.speed_combo.setToolTip("變速輸出使用串流引擎，且不含音訊")
+        self.speed_combo.currentIndexChanged.connect(lambda index: self.update_plan())
+        options_layout.addWidget(self.speed_combo)
+        self.ease_combo = QComboBox()
+        for ease, label in rew_engine.EASING_LABELS.items():
+            self.ease_combo.addItem(label, ease)
+        self.ease_combo.currentIndexChanged.connect(lambda index: self.update_plan())
+        options_layout.addWidget(self.ease_combo)
         options_layout.addStretch()
+        self.strategy_combo = QComboBox()
+        self.strategy_combo.addItem("自動", None)
+        for strategy in rew_planner.STRATEGIES:
+            self.strategy_combo.addItem(rew_planner.STRATEGY_LABELS[strategy], strategy)
+        options_layout.addWidget(self.strategy_combo)
+        self.format_combo = QComboBox()
+        for output_format in rew_engine.OUTPUT_FORMATS:
+            self.format_combo.addItem(rew_engine.OUTPUT_FORMAT_LABELS[output_format], output_format)
+        options_layout.addWidget(self.format_combo)
         main_layout.addLayout(options_layout)
 
+        self.plan_label = QLabel("")
+        self.plan_label.setStyleSheet("color: #888; font-family: Consolas, monospace;")
+        main_layout.addWidget(self.plan_label)
+
         btn_layout = QHBoxLayout()
         self.select_btn = QPushButton("選擇檔案")
         self.select_btn.clicked.connect(self.select_file)
@@ -280,12 +338,65 @@ class MainWindow(QMainWindow):
         self.start_btn.setEnabled(True)
         self.status_label.setText("等待開始...")
         self.progress_bar.setValue(0)
+        self.start_planning(file_path)
+
+    def start_planning(self, path):
+        self.source_info = None; self.speed_info = None; self.plan = None
+        self.strategy_combo.setItemText(0, "自動")
+        self.plan_label.setText("分析影片中...")
+        # 保留仍在執行的預估工作，避免執行緒被提早回收
+        self.plan_jobs = [(t, w) for t, w in self.plan_jobs if t.isRunning()]
+        thread = QThread(self)
+        worker = PlanWorker(path)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(self.on_plan_ready)
+        worker.error.connect(self.on_plan_error)
+        worker.finished.connect(thread.quit)
+        worker.error.connect(thread.quit)
+        self.plan_jobs.append((thread, worker))
+        thread.start()
+
+    @Slot(str, str)
+    def on_plan_error(self, path, message):
+        if path != self.current_file_path: return  # 已換了其他影片
+        self.plan_label.setText(message)
+
+    @Slot(str, object, object)
+    def on_plan_ready(self, path, info, speeds):
+        if path != self.current_file_path: return  # 已換了其他影片
+        self.source_info = info; self.speed_info = speeds
+        self.update_plan()
+
+    def update_plan(self):
+        if not self.source_info: return
+        mode = "boomerang" if self.boomerang_check.isChecked() else "reverse"
+        strategies = rew_planner.ENGINE_STRATEGIES if self.is_variable_speed() else rew_planner.STRATEGIES
+        self.plan = rew_planner.plan_job(self.source_info, self.speed_info, mode=mode,
+                                         speed=self.speed_combo.currentData(), strategies=strategies)
+        self.strategy_combo.setItemText(0, f"自動 (建議: {rew_planner.STRATEGY_LABELS[self.plan.choice]})")
+        self.plan_label.setText(self.plan.summary())
+    def is_variable_speed(self):
+        return self.speed_combo.currentData() != 1 or self.ease_combo.currentData() != "linear"
+
     def start_processing(self):
         if not self.current_file_path: return
         self.start_btn.setEnabled(False); self.select_btn.setEnabled(False); self.boomerang_check.setEnabled(False)
+        self.strategy_combo.setEnabled(False); self.format_combo.setEnabled(False)
+        self.speed_combo.setEnabled(False); self.ease_combo.setEnabled(False)
         self.file_label.setStyleSheet("color: #FFC107; font-size: 18px; font-weight: bold;")
+        # 手動選擇優先，其次為自動建議；預估尚未完成時沿用原本的 MoviePy 流程
+        strategy = self.strategy_combo.currentData() or (self.plan.choice if self.plan else "moviepy")
+        # MoviePy 流程不支援變速，改用分段串流
+        if self.is_variable_speed() and strategy not in rew_planner.ENGINE_STRATEGIES: strategy = "segmented"
         self.thread = QThread()
-        self.worker = VideoReverseWorker(self.current_file_path, self.boomerang_check.isChecked())
+        self.worker = VideoReverseWorker(
+            self.current_file_path, self.boomerang_check.isChecked(), strategy,
+            self.plan.segment_frames(strategy) if self.plan else None,
+            self.source_info.has_audio if self.source_info else True,  # 預估未完成時由引擎自行偵測音訊
+            self.format_combo.currentData(),
+            self.speed_combo.currentData(), self.ease_combo.currentData()
+        )
         self.worker.moveToThread(self.thread)
         self.thread.started.connect(self.worker.run)
         self.worker.progress_msg.connect(self.update_status)
@@ -317,6 +428,15 @@ class MainWindow(QMainWindow):
         QMessageBox.critical(self, "錯誤", f"處理時發生錯誤：\n{error_msg}")
     def reset_ui(self):
         self.start_btn.setEnabled(True); self.select_btn.setEnabled(True); self.boomerang_check.setEnabled(True)
+        self.strategy_combo.setEnabled(True); self.format_combo.setEnabled(True)
+        self.speed_combo.setEnabled(True); self.ease_combo.setEnabled(True)
+
+    def closeEvent(self, event):
+        # 等待預估工作結束，避免執行中的 QThread 隨視窗一起被銷毀
+        for thread, worker in self.plan_jobs:
+            thread.quit()
+            thread.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,522 @@
+import os
+import inspect
+import logging
+import subprocess
+import numpy as np
+import imageio_ffmpeg
+
+# --- Vi-REW 串流引擎 ---
+# 不依賴 Qt，可直接 import 使用：
+#   from rew_engine import FFmpegFrameSource, iter_frames
+#   for frame in iter_frames(FFmpegFrameSource("in.mp4"), mode="boomerang"):
+#       ...  # frame 為 (h, w, 3) uint8 RGB 陣列
+#
+# 為了不多做一次複製，FFmpegFrameSource 產生的影格是唯讀陣列 (直接包住 FFmpeg 的輸出緩衝)，
+# 變速曲線重複使用同一來源影格時，也可能重複產生同一個陣列物件。
+# 需要就地修改影格時請先 frame.copy()。
+#
+# 倒轉時以「分段」方式讀取：每次只解碼 segment_frames 幀到記憶體，
+# 再以反向順序輸出，因此記憶體用量固定，與影片長度無關。
+# 音訊由 reverse_audio() 先倒轉成小檔，再與影像在同一次編碼中合併。
+#
+# output_format="fmp4" / "hls" 會邊編碼邊寫出片段，下游可以在處理途中開始讀取，
+# 工作中斷時已完成的片段仍然有效。
+#
+# 變速 (speed / ease) 時會先規劃好輸出需要哪些來源影格，
+# 沒用到的影格不會送進 Python；全 I 幀格式 (ProRes、MJPEG…) 更會直接在封包層丟棄，不解碼。
+
+DEFAULT_SEGMENT_FRAMES = 48
+# 稀疏挑選時每次 FFmpeg 讀取最多列出的影格數 (每幀約 50 字元)，
+# 避免命令列超過上限 (Windows 整行 32767 字元、Linux 單一參數 128 KB)
+MAX_SELECT_FRAMES = 256
+MODES = ("reverse", "boomerang")
+
+# 每一幀都是關鍵幀的編碼，可在解碼前直接丟棄封包
+INTRA_ONLY_CODECS = {
+    "mjpeg", "prores", "dnxhd", "rawvideo", "png", "huffyuv", "ffvhuff",
+    "utvideo", "ffv1", "jpeg2000", "v210", "cfhd",
+}
+
+# 支援的像素格式與每像素位元數；packed 格式為 (h, w, c)，planar 格式為 (h * bits / 8, w)
+PIX_FMT_BITS = {"rgb24": 24, "bgr24": 24, "gray": 8, "yuv420p": 12, "nv12": 12, "yuv444p": 24}
+PACKED_CHANNELS = {"rgb24": 3, "bgr24": 3, "gray": 1}
+# 色度垂直/水平都減半的格式，寬高必須為偶數
+SUBSAMPLED_PIX_FMTS = {"yuv420p", "nv12"}
+
+# 輸出格式：一般 MP4 (moov 於結尾寫入)、分段 MP4、HLS (m3u8 + 片段)
+OUTPUT_FORMATS = ("mp4", "fmp4", "hls")
+OUTPUT_EXTENSIONS = {"mp4": ".mp4", "fmp4": ".mp4", "hls": ".m3u8"}
+OUTPUT_FORMAT_LABELS = {"mp4": "MP4", "fmp4": "分段 MP4 (邊寫邊讀)", "hls": "HLS (m3u8 + 片段)"}
+FRAGMENT_SECONDS = 2.0
+
+# 變速曲線：輸入/輸出皆為 0~1 的時間比例
+EASINGS = {
+    "linear": lambda u: u,
+    "in": lambda u: u * u,
+    "out": lambda u: 1 - (1 - u) * (1 - u),
+    "in_out": lambda u: u * u * (3 - 2 * u),
+}
+EASING_LABELS = {"linear": "等速", "in": "漸快", "out": "漸慢", "in_out": "兩端慢"}
+
+
+# 編碼器設定 (codec, preset, 參數)；參數中的 -pix_fmt yuv420p 確保 Windows 可播放
+ENCODER_SETTINGS = {
+    "nvidia": ("h264_nvenc", "p1", ['-rc', 'constqp', '-qp', '18', '-zerolatency', '1', '-pix_fmt', 'yuv420p']),
+    "amd": ("h264_amf", "speed", ['-rc', 'cqp', '-qp_p', '18', '-qp_i', '18', '-usage', 'ultralowlatency',
+                                  '-pix_fmt', 'yuv420p']),
+    "intel": ("h264_qsv", "veryfast", ['-global_quality', '18', '-pix_fmt', 'yuv420p']),
+    "cpu": ("libx264", "ultrafast", ['-crf', '18', '-pix_fmt', 'yuv420p']),
+}
+_hardware_encoder = {}
+
+# 縮放/裁切本來就會讓輸出尺寸與來源不同，不需要 imageio-ffmpeg 每次讀取都警告
+logging.getLogger("imageio_ffmpeg").addFilter(
+    lambda record: "is different from the source frame size" not in record.getMessage()
+)
+
+
+class ReverseCancelled(Exception):
+    """cancel() 回傳 True 時由引擎拋出。"""
+
+
+def container_params(output_format="mp4", path=None, fragment_seconds=FRAGMENT_SECONDS):
+    """回傳對應輸出格式的 FFmpeg 輸出參數，也可直接加進 MoviePy 的 ffmpeg_params。
+
+    path 為輸出檔路徑，HLS 會依此命名 init 片段，避免同資料夾的多個輸出互相覆蓋。
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支援的輸出格式: {output_format} (可用: {', '.join(OUTPUT_FORMATS)})")
+    if output_format == "mp4":
+        return []
+    # 固定間隔強制關鍵幀，每個片段都能獨立解碼
+    params = ["-force_key_frames", f"expr:gte(t,n_forced*{fragment_seconds})"]
+    if output_format == "fmp4":
+        # moov 一開始就寫出，之後每個關鍵幀一個 moof 片段
+        return params + ["-movflags", "+frag_keyframe+empty_moov+default_base_moof", "-f", "mp4"]
+    # HLS 片段同樣使用 fMP4 (init + .m4s)，與分段 MP4 共用相同的封裝
+    params += ["-f", "hls", "-hls_time", str(fragment_seconds), "-hls_list_size", "0",
+               "-hls_playlist_type", "event", "-hls_segment_type", "fmp4"]
+    if path:
+        params += ["-hls_fmp4_init_filename", os.path.splitext(os.path.basename(path))[0] + "_init.mp4"]
+    return params
+
+
+# --- 編碼器 ---
+def detect_hardware_encoder(ffmpeg_path=None):
+    """回傳可用的硬體編碼器種類 ("nvidia" / "amd" / "intel")，沒有時回傳 None。結果會快取。"""
+    ffmpeg_path = ffmpeg_path or imageio_ffmpeg.get_ffmpeg_exe()
+    if not ffmpeg_path: return None
+    if ffmpeg_path not in _hardware_encoder:
+        gpu_type = None
+        try:
+            result = subprocess.run([ffmpeg_path, "-encoders"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            output = result.stdout
+            if "h264_nvenc" in output: gpu_type = "nvidia"
+            elif "h264_amf" in output: gpu_type = "amd"
+            elif "h264_qsv" in output: gpu_type = "intel"
+        except Exception:
+            gpu_type = None
+        _hardware_encoder[ffmpeg_path] = gpu_type
+    return _hardware_encoder[ffmpeg_path]
+
+
+def encoder_settings(gpu_type=None):
+    """回傳 (codec, preset, ffmpeg_params)；gpu_type 為 None 時使用 CPU (libx264 ultrafast)。"""
+    codec, preset, params = ENCODER_SETTINGS[gpu_type or "cpu"]
+    return codec, preset, list(params)
+
+
+def _video_pts_range(path):
+    """回傳影像串流第一幀與最後一幀的時間戳 (秒)，只讀取頭尾的封包、不解碼；失敗時回傳 None。
+
+    許多檔案的第一幀不在 0 秒 (B 幀延遲、剪輯過的 MKV/TS…)，影格索引需以此為起點換算。
+    """
+    def packet_pts(input_params, frames=None):
+        cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-copyts"] + input_params + [
+               "-i", path, "-map", "0:v:0", "-c", "copy"]
+        cmd += (["-frames:v", str(frames)] if frames else []) + ["-f", "framecrc", "-"]
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace").stdout
+        tb, pts = None, []
+        for line in out.splitlines():
+            if line.startswith("#tb 0:"):
+                num, den = line.split(":")[1].strip().split("/")
+                tb = int(num) / int(den)
+            elif line.startswith("0,"):
+                try: pts.append(int(line.split(",")[2]))
+                except ValueError: pass  # 無時間戳的封包
+        return [p * tb for p in pts] if tb else []
+
+    # 封包依解碼順序排列，取開頭數十個封包的最小 pts 才是第一個顯示的影格
+    head = packet_pts([], 64)
+    tail = packet_pts(["-sseof", "-2"])
+    if not head or not tail: return None
+    return min(head), max(tail)
+
+
+def _frame_shape(pix_fmt, w, h):
+    channels = PACKED_CHANNELS.get(pix_fmt)
+    if channels == 1: return (h, w)
+    if channels: return (h, w, channels)
+    return (h * PIX_FMT_BITS[pix_fmt] // 8, w)
+
+
+# --- 影格來源 ---
+# 任何物件只要提供 fps、n_frames、size (w, h) 與 read(start, stop) 即可作為來源，
+# read 需依序產生 [start, stop) 範圍內的影格。
+# 若 read 另外接受 keep (遞增的影格索引)，則只需產生 keep 指定的影格。
+class ArrayFrameSource:
+    """記憶體中的影格序列 (list 或 (n, h, w, 3) 陣列)，方便串接與測試。"""
+
+    def __init__(self, frames, fps=30.0):
+        self.frames = frames
+        self.fps = float(fps)
+        self.n_frames = len(frames)
+        h, w = np.asarray(frames[0]).shape[:2] if self.n_frames else (0, 0)
+        self.size = (w, h)
+
+    def read(self, start, stop, keep=None):
+        for i in (range(start, stop) if keep is None else keep):
+            yield np.asarray(self.frames[i])
+
+
+class FFmpegFrameSource:
+    """以 FFmpeg 解碼影片檔的 [start_frame, end_frame] 區間 (含終點)。
+
+    crop=(x, y, w, h)、size=(w, h) (可用 -2 保持比例)、fps (統一幀率) 都在 FFmpeg 的
+    解碼濾鏡中完成，Python 只會拿到目標尺寸的影格。pix_fmt 可設為 "yuv420p" 等格式，
+    讓影格以 YUV 直接交給編碼器，省去兩次 RGB 轉換。
+    產生的影格為唯讀陣列，要修改請先 copy()。
+    """
+
+    def __init__(self, path, start_frame=0, end_frame=None, size=None, crop=None, fps=None, pix_fmt="rgb24"):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"找不到檔案: {path}")
+        if pix_fmt not in PIX_FMT_BITS:
+            raise ValueError(f"不支援的像素格式: {pix_fmt} (可用: {', '.join(PIX_FMT_BITS)})")
+        self.path = path
+        self.pix_fmt = pix_fmt
+
+        # 濾鏡順序：統一幀率 → (讀取時的影格挑選) → 裁切 → 縮放
+        self._fps_filters = [f"fps={fps!r}"] if fps else []
+        self._post_filters = []
+        if crop: self._post_filters.append("crop={}:{}:{}:{}".format(crop[2], crop[3], crop[0], crop[1]))
+        if size: self._post_filters.append("scale={}:{}".format(*size))
+
+        # 只讀取 header 取得基本資訊 (含濾鏡後的輸出尺寸)，不解碼任何影格
+        reader = imageio_ffmpeg.read_frames(path, pix_fmt=pix_fmt, bits_per_pixel=PIX_FMT_BITS[pix_fmt],
+                                            output_params=self._vf_params(self._fps_filters + self._post_filters))
+        try:
+            meta = next(reader)
+        finally:
+            reader.close()
+
+        self.source_fps = meta.get("fps") or 30.0
+        self.fps = float(fps) if fps else self.source_fps
+        self.size = tuple(meta["size"])
+        self.source_size = tuple(meta.get("source_size") or self.size)
+        if pix_fmt in SUBSAMPLED_PIX_FMTS and (self.size[0] % 2 or self.size[1] % 2):
+            raise ValueError(f"{pix_fmt} 的寬高必須為偶數，crop/size 處理後為 {self.size[0]}x{self.size[1]} "
+                             f"(可用 -2 讓 FFmpeg 依比例取偶數)")
+        self.codec = meta.get("codec", "")
+        # 統一幀率可能重複影格，此時不能在封包層丟棄
+        self.intra_only = self.codec.split(" ")[0].lower() in INTRA_ONLY_CODECS and not fps
+
+        # 影格 i 的時間戳為 start_time + i / fps；幀數由最後一幀的時間戳推算，
+        # 部分容器 (例如有起始偏移的 MKV) 的 duration 會把偏移算進去
+        pts_range = _video_pts_range(path)
+        if pts_range:
+            self.start_time = pts_range[0]
+            total = int(round((pts_range[1] - pts_range[0]) * self.source_fps)) + 1
+            if fps: total = int(round(total * self.fps / self.source_fps))
+        else:
+            self.start_time = 0.0
+            total = int(round((meta.get("duration") or 0) * self.fps))
+
+        # 邊界修正
+        start_frame = max(0, int(start_frame))
+        if end_frame is None or end_frame >= total: end_frame = total - 1
+        self.start_frame = start_frame
+        self.n_frames = max(0, int(end_frame) - start_frame + 1)
+
+    @staticmethod
+    def _vf_params(filters):
+        return ["-vf", ",".join(filters)] if filters else []
+
+    def _read_params(self, start, stop, keep):
+        # -copyts 保留原始時間戳：先快速 seek 到前一個關鍵幀，再以 pts 換算出的影格索引挑選，
+        # 不依賴各容器精準 seek 的行為。-ss 以容器起點為 0，時間戳則需減去第一幀的 start_time
+        t = max(0.0, (self.start_frame + start - 0.5) / self.fps)
+        input_params = ["-copyts", "-ss", f"{t:.6f}"]
+        output_params = ["-fps_mode", "passthrough"]
+
+        if self.intra_only:
+            # 全 I 幀：在封包層丟棄不需要的影格，完全不解碼
+            index = f"round((pts*tb-{self.start_time!r})*{self.fps!r})"
+        else:
+            # 一般編碼仍需解碼參考幀，但只有選中的影格會進行縮放/轉換並送進 Python
+            index = f"round((t-{self.start_time!r})*{self.fps!r})"
+
+        if keep is None or len(keep) == stop - start:
+            expr = f"gte({index}\\,{self.start_frame + start})"
+        else:
+            expr = "+".join(f"eq({index}\\,{self.start_frame + k})" for k in keep)
+
+        if self.intra_only:
+            input_params += ["-bsf:v", f"noise=drop=not({expr})"]
+            filters = self._post_filters
+        else:
+            filters = self._fps_filters + [f"select={expr}"] + self._post_filters
+        return input_params, output_params + self._vf_params(filters)
+
+    def read(self, start, stop, keep=None):
+        if keep is not None and len(keep) != stop - start and len(keep) > MAX_SELECT_FRAMES:
+            # 挑選的影格太多時拆成數次讀取，每次只列出 MAX_SELECT_FRAMES 幀
+            for i in range(0, len(keep), MAX_SELECT_FRAMES):
+                chunk = keep[i:i + MAX_SELECT_FRAMES]
+                yield from self._read_once(int(chunk[0]), int(chunk[-1]) + 1, chunk)
+            return
+        yield from self._read_once(start, stop, keep)
+
+    def _read_once(self, start, stop, keep):
+        w, h = self.size
+        shape = _frame_shape(self.pix_fmt, w, h)
+        count = stop - start if keep is None else len(keep)
+        input_params, output_params = self._read_params(start, stop, keep)
+        reader = imageio_ffmpeg.read_frames(
+            self.path,
+            pix_fmt=self.pix_fmt,
+            bits_per_pixel=PIX_FMT_BITS[self.pix_fmt],
+            input_params=input_params,
+            output_params=output_params + ["-frames:v", str(count)],
+        )
+        try:
+            next(reader)
+            for buf in reader:
+                yield np.frombuffer(buf, dtype=np.uint8).reshape(shape)
+        finally:
+            reader.close()
+
+
+# --- 影格輸出 ---
+# 任何有 write(frame) 的物件 (或單純的 callable) 都能作為輸出，close() 為選擇性。
+class FFmpegFrameSink:
+    """把影格直接送進 FFmpeg 編碼，不產生中間檔。pix_fmt_in 需與來源的 pix_fmt 一致。
+
+    output_format 見 OUTPUT_FORMATS；audio_path 可指定已處理好的音訊檔一起合併。
+    """
+
+    def __init__(self, path, fps, size, codec="libx264", preset="ultrafast", ffmpeg_params=None,
+                 pix_fmt_in="rgb24", output_format="mp4", fragment_seconds=FRAGMENT_SECONDS, audio_path=None):
+        params = list(ffmpeg_params) if ffmpeg_params is not None else ["-crf", "18"]
+        # 輸出固定為 yuv420p，移除參數中重複的 -pix_fmt
+        if "-pix_fmt" in params:
+            i = params.index("-pix_fmt")
+            del params[i:i + 2]
+        output_params = (["-preset", preset] if preset else []) + params
+        output_params += container_params(output_format, path, fragment_seconds)
+        if audio_path: output_params += ["-shortest"]
+        self.path = path
+        self._writer = imageio_ffmpeg.write_frames(
+            path, tuple(size), fps=fps, codec=codec, quality=None,
+            pix_fmt_in=pix_fmt_in, pix_fmt_out="yuv420p", macro_block_size=2,
+            output_params=output_params,
+            audio_path=audio_path, audio_codec="aac" if audio_path else None,
+        )
+        self._writer.send(None)  # 啟動 generator
+
+    def write(self, frame):
+        self._writer.send(np.ascontiguousarray(frame))
+
+    def close(self):
+        self._writer.close()
+
+
+# --- 輸出順序規劃 ---
+def _forward_order(n_frames, speed, ease):
+    if speed <= 0:
+        raise ValueError(f"速度必須大於 0: {speed}")
+    if ease not in EASINGS:
+        raise ValueError(f"不支援的變速曲線: {ease} (可用: {', '.join(EASINGS)})")
+    if speed == 1 and ease == "linear":
+        return np.arange(n_frames)
+    # 輸出幀數依平均速度決定，再用變速曲線把輸出時間對應回來源位置
+    n_out = max(1, int(np.ceil(n_frames / speed))) if n_frames else 0
+    u = np.arange(n_out) * speed / max(n_frames, 1)
+    positions = EASINGS[ease](np.clip(u, 0.0, 1.0)) * n_frames
+    return np.minimum(positions.astype(np.int64), n_frames - 1)
+
+
+def frame_order(n_frames, mode="reverse", speed=1.0, ease="linear"):
+    """回傳輸出時依序使用的來源影格索引。speed > 1 時只會用到部分來源影格。"""
+    forward = _forward_order(n_frames, speed, ease)
+    if mode == "reverse":
+        return n_frames - 1 - forward
+    if mode == "boomerang":
+        # 與 GUI 相同：正向 + 倒轉
+        return np.concatenate([forward, n_frames - 1 - forward])
+    raise ValueError(f"不支援的模式: {mode} (可用: {', '.join(MODES)})")
+
+
+def _split_segments(order, segment_frames):
+    # 依序切段，每段涵蓋的來源範圍不超過 segment_frames 幀
+    start = 0
+    while start < len(order):
+        lo = hi = order[start]
+        stop = start + 1
+        while stop < len(order):
+            v = order[stop]
+            if max(hi, v) - min(lo, v) >= segment_frames: break
+            lo, hi = min(lo, v), max(hi, v)
+            stop += 1
+        yield order[start:stop], int(lo), int(hi) + 1
+        start = stop
+
+
+def _read(source, lo, hi, keep):
+    if len(keep) == hi - lo:
+        return source.read(lo, hi)
+    if "keep" in inspect.signature(source.read).parameters:
+        return source.read(lo, hi, keep)
+    # 來源不支援 keep：全部讀取後在 Python 端過濾
+    wanted = set(keep.tolist())
+    return (frame for idx, frame in enumerate(source.read(lo, hi), lo) if idx in wanted)
+
+
+def _short_read(lo, hi, expected, got):
+    # 來源少給影格時，後面的影格會整段錯位，不能默默略過
+    return RuntimeError(f"來源影格不足: [{lo}, {hi}) 需要 {expected} 幀，只讀到 {got} 幀")
+
+
+def _close(frames):
+    # 提前結束時立即關閉來源 (例如 FFmpeg 子行程)
+    if hasattr(frames, "close"): frames.close()
+
+
+def iter_planned_frames(source, order, segment_frames=DEFAULT_SEGMENT_FRAMES, progress=None, cancel=None):
+    """依 order 指定的來源索引順序產生影格。
+
+    progress(done, total) 於每幀輸出後呼叫；cancel() 回傳 True 時拋出 ReverseCancelled。
+    同一段內重複的索引會產生同一個影格物件 (不另外複製)。
+    """
+    order = np.asarray(order, dtype=np.int64)
+    total = len(order)
+    done = 0
+
+    for segment, lo, hi in _split_segments(order, max(1, int(segment_frames))):
+        keep = np.unique(segment)
+        frames = _read(source, lo, hi, keep)
+        if len(segment) == 1 or np.all(np.diff(segment) >= 0):
+            # 正向段：邊解碼邊輸出，不需暫存
+            pos = got = 0
+            try:
+                for idx, frame in zip(keep.tolist(), frames):
+                    got += 1
+                    while pos < len(segment) and segment[pos] == idx:
+                        if cancel and cancel(): raise ReverseCancelled()
+                        yield frame
+                        done += 1; pos += 1
+                        if progress: progress(done, total)
+                    if pos >= len(segment): break
+            finally:
+                _close(frames)
+            if pos < len(segment): raise _short_read(lo, hi, len(keep), got)
+            continue
+
+        # 其他 (倒轉) 段：先把本段需要的影格解碼進記憶體，再依規劃順序輸出
+        buffer = {}
+        try:
+            for idx, frame in zip(keep.tolist(), frames):
+                if cancel and cancel(): raise ReverseCancelled()
+                buffer[idx] = frame
+        finally:
+            _close(frames)
+        if len(buffer) < len(keep): raise _short_read(lo, hi, len(keep), len(buffer))
+
+        for idx in segment:
+            if cancel and cancel(): raise ReverseCancelled()
+            yield buffer[int(idx)]
+            done += 1
+            if progress: progress(done, total)
+        buffer.clear()
+
+
+def iter_frames(source, mode="reverse", segment_frames=DEFAULT_SEGMENT_FRAMES, progress=None, cancel=None,
+                speed=1.0, ease="linear"):
+    """以 generator 產生倒轉 (reverse) 或正向+倒轉 (boomerang) 的影格。
+
+    speed 為平均播放速度 (例如 4 代表 4 倍速)，ease 為變速曲線 (見 EASINGS)。
+    """
+    order = frame_order(source.n_frames, mode, speed, ease)
+    # 變速時每段涵蓋的來源範圍等比放大，暫存的影格數仍維持約 segment_frames
+    span = int(segment_frames * max(1.0, np.ceil(speed)))
+    return iter_planned_frames(source, order, span, progress, cancel)
+
+
+def write_frames(frames, sink):
+    """把影格寫入任意 sink，回傳寫入幀數；結束或中斷時會呼叫 sink.close()。"""
+    write = sink.write if hasattr(sink, "write") else sink
+    count = 0
+    try:
+        for frame in frames:
+            write(frame)
+            count += 1
+    finally:
+        if hasattr(sink, "close"): sink.close()
+    return count
+
+
+def has_audio_stream(path):
+    """來源是否含有音訊串流 (只讀取 header，不解碼)。"""
+    result = subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-i", path],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace")
+    return any("Stream #" in line and "Audio:" in line for line in result.stderr.splitlines())
+
+
+def reverse_audio(audio_source, output_path, start_time=0.0, end_time=None, mode="reverse"):
+    """把 audio_source 的 [start_time, end_time] 音訊依 mode 倒轉，輸出為 AAC 音訊檔。"""
+    if mode == "reverse":
+        audio_filter = "[0:a:0]areverse[a]"
+    elif mode == "boomerang":
+        audio_filter = "[0:a:0]asplit[f][r];[r]areverse[rv];[f][rv]concat=n=2:v=0:a=1[a]"
+    else:
+        raise ValueError(f"不支援的模式: {mode} (可用: {', '.join(MODES)})")
+
+    audio_range = ["-ss", f"{start_time:.6f}"] + (["-to", f"{end_time:.6f}"] if end_time is not None else [])
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-v", "error"] + audio_range + [
+           "-i", audio_source, "-filter_complex", audio_filter, "-map", "[a]",
+           "-vn", "-c:a", "aac", output_path]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace")
+    if result.returncode != 0:
+        raise RuntimeError(f"處理音訊失敗:\n{result.stderr}")
+    return output_path
+
+
+def reverse_file(input_path, output_path, mode="reverse", start_frame=0, end_frame=None,
+                 segment_frames=DEFAULT_SEGMENT_FRAMES, progress=None, cancel=None,
+                 speed=1.0, ease="linear", size=None, crop=None, fps=None, with_audio=False, **sink_options):
+    """檔案對檔案的便利函式，sink_options 會傳給 FFmpegFrameSink (例如 output_format="fmp4")。
+
+    Python 端不處理影格內容，因此全程以 yuv420p 傳遞，不做 RGB 轉換。
+    with_audio=True 時一併倒轉同範圍的音訊 (僅支援原速)；來源沒有音訊時只輸出影像。
+    """
+    if with_audio and not has_audio_stream(input_path): with_audio = False
+    if with_audio and (speed != 1 or ease != "linear"):
+        raise ValueError("變速輸出不支援音訊")
+    source = FFmpegFrameSource(input_path, start_frame, end_frame, size=size, crop=crop, fps=fps, pix_fmt="yuv420p")
+
+    audio_path = None
+    if with_audio:
+        audio_path = os.path.splitext(output_path)[0] + "_temp_audio.m4a"
+        start_time = source.start_frame / source.fps
+        reverse_audio(input_path, audio_path, start_time, start_time + source.n_frames / source.fps, mode)
+
+    try:
+        sink = FFmpegFrameSink(output_path, source.fps, source.size, pix_fmt_in=source.pix_fmt,
+                               audio_path=audio_path, **sink_options)
+        frames = iter_frames(source, mode, segment_frames, progress, cancel, speed=speed, ease=ease)
+        write_frames(frames, sink)
+    finally:
+        if audio_path and os.path.exists(audio_path):
+            try: os.remove(audio_path)
+            except OSError: pass
+    return output_path
@@ -0,0 +1,275 @@
+import os
+import re
+import math
+import sys
+import time
+import subprocess
+import imageio_ffmpeg
+
+import rew_engine
+
+# --- Vi-REW 工作規劃 ---
+# 開始處理前先探測來源 (編碼、解析度、GOP、長度、是否有音訊)，
+# 再依本機實測的解碼/編碼速度，估算各策略的執行時間與記憶體峰值，自動挑選最佳策略：
+#   info = probe("in.mp4")
+#   plan = plan_job(info, measure_speed(info), 0, 299, "boomerang")
+#   print(plan.summary(), plan.choice)
+
+STRATEGIES = ("moviepy", "segmented", "in_memory")
+ENGINE_STRATEGIES = ("segmented", "in_memory")  # 變速只有串流引擎支援
+STRATEGY_LABELS = {
+    "moviepy": "MoviePy 原始流程",
+    "segmented": "分段串流",
+    "in_memory": "全部載入記憶體",
+}
+
+BASE_MEMORY = 200 * 1024 ** 2  # Python + Qt + MoviePy 本身的用量
+MEMORY_BUDGET = 0.6            # 最多使用可用記憶體的比例
+GOP_PROBE_SECONDS = 10.0       # 只掃描開頭這幾秒的封包來估計 GOP
+BENCH_FRAMES = 30
+AUDIO_BENCH_SECONDS = 20
+DEFAULT_AUDIO_SPEED = 50.0     # 未實測時假設的 AAC 編碼倍速
+
+_speed_cache = {}
+
+
+class SourceInfo:
+    def __init__(self, path, codec, size, fps, duration, gop, intra_only, has_audio):
+        self.path = path
+        self.codec = codec
+        self.size = size
+        self.fps = fps
+        self.duration = duration
+        self.gop = gop
+        self.intra_only = intra_only
+        self.has_audio = has_audio
+
+    @property
+    def n_frames(self):
+        return int(round(self.duration * self.fps))
+
+
+class SpeedInfo:
+    """本機實測速度 (幀/秒)、AAC 編碼倍速與啟動一次 FFmpeg 的固定成本 (秒)。"""
+
+    def __init__(self, decode_fps, encode_fps, spawn_seconds, audio_speed=None):
+        self.decode_fps = decode_fps
+        self.encode_fps = encode_fps
+        self.spawn_seconds = spawn_seconds
+        self.audio_speed = audio_speed
+
+
+class Estimate:
+    def __init__(self, strategy, seconds, memory, feasible=True):
+        self.strategy = strategy
+        self.seconds = seconds
+        self.memory = memory
+        self.feasible = feasible
+
+
+class JobPlan:
+    def __init__(self, info, n_frames, mode, estimates, choice):
+        self.info = info
+        self.n_frames = n_frames
+        self.mode = mode
+        self.estimates = estimates
+        self.choice = choice
+
+    def segment_frames(self, strategy=None):
+        # 全部載入記憶體 = 單一分段涵蓋整個範圍，只解碼一次
+        if (strategy or self.choice) == "in_memory":
+            return max(1, self.n_frames)
+        return rew_engine.DEFAULT_SEGMENT_FRAMES
+
+    def summary(self):
+        info = self.info
+        gop = "全 I 幀" if info.intra_only else f"GOP {info.gop}"
+        lines = [f"{info.codec} {info.size[0]}x{info.size[1]} @ {info.fps:.2f}fps, {gop}, "
+                 f"{'有' if info.has_audio else '無'}音訊, {self.n_frames} 幀"]
+        for strategy, est in self.estimates.items():
+            mark = "★" if strategy == self.choice else ("✕" if not est.feasible else "  ")
+            lines.append(f"{mark} {STRATEGY_LABELS[strategy]}: 約 {format_seconds(est.seconds)}, "
+                         f"記憶體 {est.memory / 1024 ** 2:.0f} MB")
+        return "\n".join(lines)
+
+
+def format_seconds(seconds):
+    if seconds < 60: return f"{seconds:.0f} 秒"
+    return f"{int(seconds // 60)} 分 {int(seconds % 60):02} 秒"
+
+
+def available_memory():
+    """回傳目前可用的實體記憶體 (bytes)，無法取得時回傳 None。"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullAvailPhys
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# --- 來源探測 ---
+def _run_ffmpeg(args):
+    return subprocess.run([imageio_ffmpeg.get_ffmpeg_exe()] + args,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace")
+
+
+def probe(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到檔案: {path}")
+
+    header = _run_ffmpeg(["-hide_banner", "-i", path]).stderr
+    video_line = next((line for line in header.splitlines() if "Video:" in line), None)
+    if video_line is None:
+        raise ValueError(f"找不到影像串流: {path}")
+
+    codec = video_line.split("Video:")[1].strip().split(" ")[0].rstrip(",")
+    size_match = re.search(r" (\d{2,5})x(\d{2,5})[ ,]", video_line)
+    size = (int(size_match.group(1)), int(size_match.group(2))) if size_match else (0, 0)
+    fps_match = re.search(r"([\d.]+) (?:fps|tbr)", video_line)
+    fps = float(fps_match.group(1)) if fps_match else 30.0
+    dur_match = re.search(r"Duration: (\d+):(\d+):([\d.]+)", header)
+    duration = int(dur_match.group(1)) * 3600 + int(dur_match.group(2)) * 60 + float(dur_match.group(3)) if dur_match else 0.0
+    has_audio = "Audio:" in header
+
+    # 只複製封包不解碼：framecrc 中非關鍵幀會帶 F=0x0 旗標
+    crc = _run_ffmpeg(["-v", "error", "-t", str(GOP_PROBE_SECONDS), "-i", path,
+                       "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"]).stdout
+    packets = [line for line in crc.splitlines() if line.startswith("0,")]
+    keyframes = sum(1 for line in packets if "F=" not in line)
+    intra_only = codec.lower() in rew_engine.INTRA_ONLY_CODECS or (packets and keyframes == len(packets))
+    gop = 1 if intra_only else max(1, round(len(packets) / max(1, keyframes)))
+    # 掃描範圍內只有一個關鍵幀時，GOP 至少與整段一樣長
+    if keyframes <= 1 and not intra_only: gop = max(gop, int(round(duration * fps)))
+
+    return SourceInfo(path, codec, size, fps, duration, gop, bool(intra_only), has_audio)
+
+
+# --- 本機速度實測 ---
+def _timed(args):
+    start = time.perf_counter()
+    result = _run_ffmpeg(args)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg 執行失敗:\n{result.stderr}")
+    return time.perf_counter() - start
+
+
+def measure_speed(info, codec="libx264", preset="ultrafast", ffmpeg_params=None):
+    """實測本機解碼此來源與編碼同解析度影片的速度，結果會快取。
+
+    codec / preset / ffmpeg_params 應與實際處理時相同 (見 rew_engine.encoder_settings)，
+    硬體編碼器與 libx264 的速度可能差上數倍。
+    """
+    params = list(ffmpeg_params) if ffmpeg_params is not None else ["-crf", "18"]
+    if "-pix_fmt" in params:
+        i = params.index("-pix_fmt")
+        del params[i:i + 2]
+    key = (info.path, info.size, codec, preset, tuple(params))
+    if key in _speed_cache: return _speed_cache[key]
+
+    spawn = _timed(["-v", "error", "-f", "lavfi", "-i", "nullsrc=s=16x16", "-frames:v", "1", "-f", "null", "-"])
+
+    decode_frames = max(1, min(BENCH_FRAMES, info.n_frames))
+    elapsed = _timed(["-v", "error", "-i", info.path, "-map", "0:v:0", "-frames:v", str(decode_frames),
+                      "-f", "null", "-"])
+    decode_fps = decode_frames / max(elapsed - spawn, 1e-3)
+
+    w, h = info.size
+    elapsed = _timed(["-v", "error", "-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate=30",
+                      "-frames:v", str(BENCH_FRAMES), "-c:v", codec, "-preset", preset] + params +
+                     ["-pix_fmt", "yuv420p", "-f", "null", "-"])
+    encode_fps = BENCH_FRAMES / max(elapsed - spawn, 1e-3)
+
+    audio_speed = None
+    if info.has_audio:
+        # reverse_audio 會把整段音訊重新編碼成 AAC
+        elapsed = _timed(["-v", "error", "-f", "lavfi", "-i", f"sine=duration={AUDIO_BENCH_SECONDS}:sample_rate=48000",
+                          "-ac", "2", "-c:a", "aac", "-f", "null", "-"])
+        audio_speed = AUDIO_BENCH_SECONDS / max(elapsed - spawn, 1e-3)
+
+    speeds = SpeedInfo(decode_fps, encode_fps, spawn, audio_speed)
+    _speed_cache[key] = speeds
+    return speeds
+
+
+# --- 估算與選擇 ---
+def plan_job(info, speeds, start_frame=0, end_frame=None, mode="reverse", speed=1.0, strategies=STRATEGIES,
+             memory_limit=None):
+    total = info.n_frames
+    if end_frame is None or end_frame >= total: end_frame = total - 1
+    n = max(1, end_frame - max(0, start_frame) + 1)
+    boomerang = mode == "boomerang"
+    # 與引擎相同的規劃：輸出幀數與每個方向實際用到的來源影格數
+    out_frames = len(rew_engine.frame_order(n, mode, speed))
+    kept = len(rew_engine.frame_order(n, "reverse", speed))
+    passes = 2 if boomerang else 1
+
+    w, h = info.size
+    rgb_bytes = w * h * 3
+    yuv_bytes = w * h * 3 // 2
+    gop = 1 if info.intra_only else min(info.gop, n)
+    decode = 1.0 / speeds.decode_fps
+    encode = 1.0 / speeds.encode_fps
+    spawn = speeds.spawn_seconds
+
+    # 音訊 (僅原速)：影像開始前 reverse_audio 先解碼、倒轉並重新編碼整段 AAC，
+    # areverse 需要整段音訊在記憶體中 (48kHz 雙聲道 float)
+    with_audio = info.has_audio and speed == 1
+    audio_seconds = n / info.fps * (2 if boomerang else 1)
+    audio_bytes = int(audio_seconds * 48000 * 2 * 4) if with_audio else 0
+    audio = spawn + audio_seconds / (speeds.audio_speed or DEFAULT_AUDIO_SPEED) if with_audio else 0.0
+
+    estimates = {}
+    if "moviepy" in strategies:
+        # time_mirror 每往回一幀就重啟 FFmpeg，從前一個關鍵幀解碼到目標幀
+        seconds = n * (spawn + (1 + gop / 2) * decode) + n * encode
+        if boomerang:
+            # 先寫倒轉暫存檔，再讀回原片與暫存檔合併輸出
+            seconds += 2 * n * decode + 2 * n * encode
+        estimates["moviepy"] = Estimate("moviepy", seconds, BASE_MEMORY + 4 * rgb_bytes)
+
+    segment = rew_engine.DEFAULT_SEGMENT_FRAMES
+    if "segmented" in strategies:
+        # iter_frames 變速時每段涵蓋 segment * ceil(speed) 幀來源，每個方向至少啟動一次 FFmpeg
+        segments = max(1, math.ceil(n / (segment * max(1, math.ceil(speed)))))
+        decode_frames = kept if info.intra_only else n + segments * gop / 2
+        if boomerang: decode_frames += kept if info.intra_only else n
+        seconds = segments * passes * spawn + decode_frames * decode + out_frames * encode + audio
+        memory = BASE_MEMORY + min(segment, kept) * yuv_bytes + audio_bytes
+        estimates["segmented"] = Estimate("segmented", seconds, memory)
+
+    if "in_memory" in strategies:
+        # 單一分段；稀疏挑選時每次讀取最多列出 MAX_SELECT_FRAMES 幀
+        reads = 1 if kept == n else math.ceil(kept / rew_engine.MAX_SELECT_FRAMES)
+        decode_frames = kept if info.intra_only else n
+        seconds = reads * spawn + decode_frames * decode + out_frames * encode + audio
+        memory = BASE_MEMORY + kept * yuv_bytes + audio_bytes
+        estimates["in_memory"] = Estimate("in_memory", seconds, memory)
+
+    if memory_limit is None:
+        available = available_memory()
+        memory_limit = available * MEMORY_BUDGET if available else 4 * 1024 ** 3
+    for est in estimates.values():
+        est.feasible = est.memory <= memory_limit
+
+    feasible = [est for est in estimates.values() if est.feasible] or list(estimates.values())
+    choice = min(feasible, key=lambda est: (est.seconds, est.memory)).strategy
+    return JobPlan(info, n, mode, estimates, choice)
+
+
+def plan(path, start_frame=0, end_frame=None, mode="reverse", speed=1.0):
+    """探測 + 實測 + 估算的便利函式。"""
+    info = probe(path)
+    return plan_job(info, measure_speed(info), start_frame, end_frame, mode, speed)
@@ -0,0 +1,225 @@
+import sys
+import json
+import argparse
+import numpy as np
+import imageio_ffmpeg
+
+import rew_engine
+
+# --- Vi-REW 影格驗證 ---
+# 比對「來源範圍」與「輸出影片」每一幀的感知雜湊 (16x16 dHash, 256 bits)，
+# 確認輸出順序與 rew_engine.frame_order() 的規劃一致，並找出掉幀、重複幀、順序錯誤與 Boomerang 接縫問題。
+# 來源與輸出各只需依序解碼一次，且由 FFmpeg 直接縮成 64x64 灰階，Python 端只做向量化的 NumPy 運算。
+# 來源刻意不經過 rew_engine 的 seek / 影格挑選，而是從頭依序解碼後在 Python 端依幀數裁切，
+# 才能抓出引擎本身的取幀錯誤。
+#
+# 程式中使用：
+#   report = verify_files("in.mp4", "in_boomerang.mp4", mode="boomerang")
+#   assert report.ok, report.summary()
+# 命令列：
+#   python rew_verify.py in.mp4 in_boomerang.mp4 --mode boomerang
+
+HASH_DECODE_SIZE = (64, 64)  # 解碼端先縮到這個大小，再計算 dHash
+HASH_SIDE = 16               # dHash 為 HASH_SIDE x HASH_SIDE bits
+MATCH_THRESHOLD = 24         # 與規劃影格的漢明距離上限 (256 bits 中)
+MATCH_SLACK = 2              # 允許比最接近的其他來源影格多出的距離 (壓縮雜訊)
+SEAM_WINDOW = 2
+BATCH_FRAMES = 64
+DISTANCE_ROWS = 16           # 每次只計算這幾個輸出幀對所有來源幀的距離，記憶體約為 rows x 來源幀數 x 32 bytes
+
+# 每個 byte 的 1 位元數，用於向量化計算漢明距離
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# --- 感知雜湊 ---
+def _gray(batch, pix_fmt):
+    if pix_fmt in ("yuv420p", "nv12"):
+        # planar YUV：前 2/3 列即為 Y (亮度) 平面
+        return batch[:, : batch.shape[1] * 2 // 3].astype(np.float32)
+    if batch.ndim == 4:
+        return batch[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return batch.astype(np.float32)
+
+
+def _block_mean(gray, rows, cols):
+    h, w = gray.shape[1:]
+    r = np.linspace(0, h, rows + 1).astype(int)
+    c = np.linspace(0, w, cols + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(gray, r[:-1], axis=1), c[:-1], axis=2)
+    return sums / (np.diff(r)[:, None] * np.diff(c)[None, :])
+
+
+def hash_batch(batch, pix_fmt="rgb24"):
+    """計算一批同尺寸影格的 dHash，回傳 (n, HASH_SIDE ** 2 / 8) 的 uint8 陣列。"""
+    means = _block_mean(_gray(np.asarray(batch), pix_fmt), HASH_SIDE, HASH_SIDE + 1)
+    bits = (means[:, :, 1:] > means[:, :, :-1]).reshape(len(means), -1)
+    return np.packbits(bits, axis=1)
+
+
+def frame_hashes(frames, pix_fmt="rgb24", batch_frames=BATCH_FRAMES):
+    """以串流方式計算任意影格序列的雜湊，記憶體只保留一批影格。"""
+    hashes, batch = [], []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) >= batch_frames:
+            hashes.append(hash_batch(np.stack(batch), pix_fmt))
+            batch = []
+    if batch: hashes.append(hash_batch(np.stack(batch), pix_fmt))
+    return np.concatenate(hashes) if hashes else np.zeros((0, HASH_SIDE ** 2 // 8), dtype=np.uint8)
+
+
+def hamming(a, b):
+    """a (m, k) 與 b (n, k) 兩組雜湊的漢明距離矩陣 (m, n)；a 應為一小批 (見 DISTANCE_ROWS)。"""
+    return _POPCOUNT[np.bitwise_xor(a[:, None, :], b[None, :, :])].sum(axis=-1, dtype=np.int32)
+
+
+# --- 檔案解碼 ---
+def _sequential_hashes(path, start_frame=0, end_frame=None):
+    # 從頭依序解碼，不 seek、不挑選影格，也不依賴 header 的幀數 (分段 MP4 的估計值可能不準)
+    w, h = HASH_DECODE_SIZE
+    reader = imageio_ffmpeg.read_frames(path, pix_fmt="gray", bits_per_pixel=8,
+                                        output_params=["-vf", f"scale={w}:{h}", "-fps_mode", "passthrough"])
+
+    def frames():
+        for idx, buf in enumerate(reader):
+            if end_frame is not None and idx > end_frame: break
+            if idx >= start_frame: yield np.frombuffer(buf, dtype=np.uint8).reshape(h, w)
+
+    try:
+        next(reader)
+        return frame_hashes(frames(), "gray")
+    finally:
+        reader.close()
+
+
+def source_hashes(path, start_frame=0, end_frame=None):
+    """來源 [start_frame, end_frame] (含終點) 的雜湊，以幀數在 Python 端裁切。"""
+    return _sequential_hashes(path, max(0, int(start_frame)), end_frame)
+
+
+def output_hashes(path):
+    return _sequential_hashes(path)
+
+
+# --- 比對 ---
+class VerifyReport:
+    def __init__(self, mode, n_source, expected, mapping, distances):
+        self.mode = mode
+        self.n_source = n_source
+        self.expected = expected
+        self.mapping = mapping
+        self.distances = distances
+        n = min(len(expected), len(mapping))
+
+        # 與規劃不符的位置 (順序錯誤或內容不同)
+        self.mismatches = [int(k) for k in np.flatnonzero(mapping[:n] != expected[:n])]
+        # 規劃中不重複、輸出卻連續出現同一來源影格
+        same = (mapping[1:n] == mapping[:n - 1]) & (expected[1:n] != expected[:n - 1])
+        self.duplicates = [int(k) + 1 for k in np.flatnonzero(same)]
+        # 規劃會用到、輸出中卻找不到的來源影格
+        self.gaps = sorted(set(expected.tolist()) - set(mapping.tolist()))
+
+        self.seam_ok = None
+        if mode == "boomerang":
+            seam = len(expected) // 2
+            window = slice(max(0, seam - SEAM_WINDOW), seam + SEAM_WINDOW)
+            self.seam_ok = (len(mapping) >= window.stop and
+                            np.array_equal(mapping[window], expected[window]))
+
+        self.length_ok = len(mapping) == len(expected)
+        self.ok = self.length_ok and not self.mismatches
+
+    def to_dict(self):
+        return {
+            "ok": bool(self.ok),
+            "mode": self.mode,
+            "source_frames": int(self.n_source),
+            "expected_frames": int(len(self.expected)),
+            "output_frames": int(len(self.mapping)),
+            "mismatches": self.mismatches,
+            "duplicates": self.duplicates,
+            "gaps": self.gaps,
+            "seam_ok": self.seam_ok,
+            "mapping": self.mapping.tolist(),
+            "expected": self.expected.tolist(),
+            "distances": self.distances.tolist(),
+        }
+
+    def summary(self, limit=10):
+        def short(items):
+            text = ", ".join(str(i) for i in items[:limit])
+            return text + (f" ... (共 {len(items)} 個)" if len(items) > limit else "")
+
+        lines = [f"{'通過' if self.ok else '失敗'}: 模式 {self.mode}, 來源 {self.n_source} 幀, "
+                 f"預期輸出 {len(self.expected)} 幀, 實際輸出 {len(self.mapping)} 幀"]
+        if self.mismatches: lines.append(f"不符位置: {short(self.mismatches)}")
+        if self.duplicates: lines.append(f"重複幀位置: {short(self.duplicates)}")
+        if self.gaps: lines.append(f"缺少的來源幀: {short(self.gaps)}")
+        if self.seam_ok is not None: lines.append(f"Boomerang 接縫: {'正確' if self.seam_ok else '錯誤'}")
+        for k in self.mismatches[:limit]:
+            expected = int(self.expected[k]) if k < len(self.expected) else "-"
+            lines.append(f"  輸出 #{k}: 預期來源 {expected}, 實際最接近 {int(self.mapping[k])}")
+        return "\n".join(lines)
+
+
+def compare(source_hashes, output_hashes, mode="reverse", speed=1.0, ease="linear",
+            threshold=MATCH_THRESHOLD, slack=MATCH_SLACK):
+    """依 rew_engine.frame_order() 的規劃比對兩組雜湊，回傳 VerifyReport。"""
+    expected = rew_engine.frame_order(len(source_hashes), mode, speed, ease)
+    n_source, n_expected = len(source_hashes), len(expected)
+    mapping = np.zeros(len(output_hashes), dtype=np.int64)
+    distances = np.zeros(len(output_hashes), dtype=np.int32)
+    if n_source == 0:
+        return VerifyReport(mode, n_source, expected, mapping[:0], distances[:0])
+
+    # 逐批計算距離，只保留每個輸出幀的對應結果，不保存完整的 輸出 x 來源 矩陣
+    for start in range(0, len(output_hashes), DISTANCE_ROWS):
+        dist = hamming(output_hashes[start:start + DISTANCE_ROWS], source_hashes)
+        best = dist.argmin(axis=1)
+        for row, k in enumerate(range(start, start + len(dist))):
+            # 依序挑選每個輸出幀對應的來源：優先延續前一幀的走向 (正常時即為規劃的影格)，其次是規劃的影格，
+            # 只要與最接近的候選差距在 slack 之內就採用，避免靜態畫面或壓縮雜訊造成誤判
+            mapping[k] = best[row]
+            candidates = []
+            if 0 < k < n_expected:
+                candidates.append(mapping[k - 1] + expected[k] - expected[k - 1])
+            if k < n_expected: candidates.append(expected[k])
+            for candidate in candidates:
+                if 0 <= candidate < n_source:
+                    d = dist[row, candidate]
+                    if d <= threshold and d <= dist[row, best[row]] + slack:
+                        mapping[k] = candidate
+                        break
+            distances[k] = dist[row, mapping[k]]
+    return VerifyReport(mode, n_source, expected, mapping, distances)
+
+
+def verify_frames(source_frames, output_frames, mode="reverse", speed=1.0, ease="linear", pix_fmt="rgb24"):
+    """驗證記憶體中的影格序列 (例如 iter_frames() 的輸出)。"""
+    return compare(frame_hashes(source_frames, pix_fmt), frame_hashes(output_frames, pix_fmt), mode, speed, ease)
+
+
+def verify_files(input_path, output_path, mode="reverse", start_frame=0, end_frame=None, speed=1.0, ease="linear"):
+    """驗證輸出檔是否為來源 [start_frame, end_frame] 依 mode 倒轉的結果。"""
+    return compare(source_hashes(input_path, start_frame, end_frame), output_hashes(output_path), mode, speed, ease)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="驗證 Vi-REW 輸出影片的影格順序")
+    parser.add_argument("input", help="來源影片")
+    parser.add_argument("output", help="要驗證的輸出影片")
+    parser.add_argument("--mode", choices=rew_engine.MODES, default="reverse")
+    parser.add_argument("--start", type=int, default=0, help="來源起始幀")
+    parser.add_argument("--end", type=int, default=None, help="來源結束幀 (含)")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--ease", choices=list(rew_engine.EASINGS), default="linear")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出完整對應表")
+    args = parser.parse_args(argv)
+
+    report = verify_files(args.input, args.output, args.mode, args.start, args.end, args.speed, args.ease)
+    print(json.dumps(report.to_dict(), ensure_ascii=False) if args.json else report.summary())
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
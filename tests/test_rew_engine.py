@@ -0,0 +1,218 @@
+import os
+import sys
+import subprocess
+import numpy as np
+import pytest
+import imageio_ffmpeg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rew_engine
+import rew_verify
+
+
+def _make_video(path, *params):
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-y", "-f", "lavfi",
+           "-i", "testsrc2=size=160x120:rate=30", "-t", "2"] + list(params) + [path]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def _decode_all(path):
+    reader = imageio_ffmpeg.read_frames(path, output_params=["-fps_mode", "passthrough"])
+    w, h = next(reader)["size"]
+    return [np.frombuffer(buf, dtype=np.uint8).reshape(h, w, 3) for buf in reader]
+
+
+# 第一幀不在 0 秒的來源：B 幀且無 edit list 的 MP4、有起始偏移的 MKV (一般編碼與全 I 幀)
+OFFSET_SOURCES = {
+    "bframes.mp4": ["-c:v", "libx264", "-bf", "2", "-pix_fmt", "yuv420p", "-use_editlist", "0"],
+    "offset.mkv": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-output_ts_offset", "1.479"],
+    "offset_mjpeg.mkv": ["-c:v", "mjpeg", "-output_ts_offset", "0.5"],
+}
+
+
+@pytest.mark.parametrize("name", sorted(OFFSET_SOURCES))
+@pytest.mark.parametrize("mode, speed, ease, start, end", [
+    ("reverse", 1.0, "linear", 0, None),
+    ("reverse", 4.0, "linear", 0, None),
+    ("boomerang", 2.0, "in_out", 0, None),
+    ("reverse", 1.0, "linear", 10, 40),
+])
+def test_offset_start_time(tmp_path, name, mode, speed, ease, start, end):
+    path = _make_video(str(tmp_path / name), *OFFSET_SOURCES[name])
+    reference = _decode_all(path)
+
+    source = rew_engine.FFmpegFrameSource(path, start, end)
+    assert source.start_time > 0
+    reference = reference[start:None if end is None else end + 1]
+    assert source.n_frames == len(reference)
+
+    frames = rew_engine.iter_frames(source, mode, speed=speed, ease=ease)
+    report = rew_verify.verify_frames(reference, frames, mode, speed, ease)
+    assert report.ok, report.summary()
+
+
+class _ShortSource(rew_engine.ArrayFrameSource):
+    # 模擬解碼器少給一幀
+    def read(self, start, stop, keep=None):
+        frames = list(super().read(start, stop, keep))
+        return iter(frames[:-1])
+
+
+@pytest.mark.parametrize("mode", rew_engine.MODES)
+def test_short_read_raises(mode):
+    source = _ShortSource([np.full((4, 4, 3), i, dtype=np.uint8) for i in range(20)])
+    with pytest.raises(RuntimeError):
+        list(rew_engine.iter_frames(source, mode))
+
+
+def test_odd_planar_size_raises(tmp_path):
+    path = _make_video(str(tmp_path / "src.mp4"), "-c:v", "libx264", "-pix_fmt", "yuv420p")
+    with pytest.raises(ValueError):
+        rew_engine.FFmpegFrameSource(path, size=(81, -1), pix_fmt="yuv420p")
+    assert rew_engine.FFmpegFrameSource(path, size=(81, -1)).size == (81, 61)
+
+
+@pytest.mark.parametrize("codec", [["-c:v", "libx264", "-pix_fmt", "yuv420p"], ["-c:v", "mjpeg"]])
+def test_sparse_select_stays_under_command_limit(tmp_path, monkeypatch, codec):
+    # 200 秒 30fps 的小影片以 2 倍速一次讀完 (同 in_memory 策略)，會挑選 3000 幀
+    path = str(tmp_path / "long.mkv")
+    subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-y", "-f", "lavfi",
+                    "-i", "testsrc2=size=64x48:rate=30", "-t", "200"] + codec + [path], check=True)
+
+    command_lengths = []
+    read_frames = imageio_ffmpeg.read_frames
+
+    def spy(path, **kwargs):
+        args = kwargs.get("input_params", []) + kwargs.get("output_params", [])
+        command_lengths.append(sum(len(arg) + 1 for arg in args))
+        return read_frames(path, **kwargs)
+
+    monkeypatch.setattr(imageio_ffmpeg, "read_frames", spy)
+    source = rew_engine.FFmpegFrameSource(path, pix_fmt="gray")
+    frames = list(rew_engine.iter_frames(source, "reverse", segment_frames=source.n_frames, speed=2))
+
+    assert len(frames) == 3000
+    assert max(command_lengths) < 32767  # Windows 整行命令列上限
+    monkeypatch.undo()
+    reader = imageio_ffmpeg.read_frames(path, pix_fmt="gray", bits_per_pixel=8,
+                                        output_params=["-fps_mode", "passthrough"])
+    next(reader)
+    reference = [np.frombuffer(buf, dtype=np.uint8).reshape(48, 64) for buf in reader]
+    expected = rew_engine.frame_order(source.n_frames, "reverse", 2)
+    assert all(np.array_equal(frame, reference[i]) for frame, i in zip(frames, expected))
+
+
+def _numbered(n):
+    # 每幀的像素值等於自己的索引，方便比對順序
+    return [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(n)]
+
+
+class _PlainSource:
+    # 只支援 read(start, stop) 的自訂來源 (沒有 keep)
+    fps = 30.0
+    size = (4, 4)
+
+    def __init__(self, n):
+        self.n_frames = n
+        self.calls = []
+
+    def read(self, start, stop):
+        self.calls.append((start, stop))
+        for i in range(start, stop):
+            yield np.full((4, 4, 3), i, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("mode", rew_engine.MODES)
+def test_progress_reports_every_frame(mode):
+    calls = []
+    frames = list(rew_engine.iter_frames(rew_engine.ArrayFrameSource(_numbered(50)), mode, segment_frames=8,
+                                         progress=lambda done, total: calls.append((done, total))))
+    assert calls == [(i + 1, len(frames)) for i in range(len(frames))]
+
+
+def test_cancel_raises_and_stops_reading():
+    source = _PlainSource(100)
+    frames = rew_engine.iter_frames(source, "reverse", segment_frames=10, cancel=lambda: len(got) >= 15)
+    got = []
+    with pytest.raises(rew_engine.ReverseCancelled):
+        for frame in frames:
+            got.append(frame)
+    assert len(got) == 15
+    assert len(source.calls) == 2
+
+
+@pytest.mark.parametrize("mode", rew_engine.MODES)
+def test_source_without_keep_filters_in_python(mode):
+    source = _PlainSource(30)
+    frames = list(rew_engine.iter_frames(source, mode, segment_frames=4, speed=2))
+    expected = rew_engine.frame_order(30, mode, 2)
+    assert [int(frame[0, 0, 0]) for frame in frames] == expected.tolist()
+    assert source.calls
+
+
+def test_write_frames_to_callable_and_object_sink():
+    frames = _numbered(10)
+    written = []
+    assert rew_engine.write_frames(iter(frames), written.append) == 10
+    assert [int(f[0, 0, 0]) for f in written] == list(range(10))
+
+    class Sink:
+        def __init__(self):
+            self.frames, self.closed = [], False
+        def write(self, frame): self.frames.append(frame)
+        def close(self): self.closed = True
+
+    sink = Sink()
+    source = rew_engine.ArrayFrameSource(frames)
+    assert rew_engine.write_frames(rew_engine.iter_frames(source, "boomerang"), sink) == 20
+    assert sink.closed
+    assert [int(f[0, 0, 0]) for f in sink.frames] == list(range(10)) + list(range(9, -1, -1))
+
+
+def test_sink_closed_on_cancel():
+    class Sink:
+        closed = False
+        def write(self, frame): pass
+        def close(self): self.closed = True
+
+    sink = Sink()
+    frames = rew_engine.iter_frames(rew_engine.ArrayFrameSource(_numbered(10)), "reverse", cancel=lambda: True)
+    with pytest.raises(rew_engine.ReverseCancelled):
+        rew_engine.write_frames(frames, sink)
+    assert sink.closed
+
+
+def test_ffmpeg_frames_are_read_only(tmp_path):
+    path = _make_video(str(tmp_path / "src.mp4"), "-c:v", "libx264", "-pix_fmt", "yuv420p")
+    source = rew_engine.FFmpegFrameSource(path)
+    frame = next(iter(rew_engine.iter_frames(source, "reverse")))
+    assert not frame.flags.writeable
+    frame.copy()[0, 0] = 0
+
+
+@pytest.mark.parametrize("mode", rew_engine.MODES)
+def test_reverse_file_fragmented_mp4(tmp_path, mode):
+    path = _make_video(str(tmp_path / "src.mp4"), "-c:v", "libx264", "-pix_fmt", "yuv420p")
+    output = str(tmp_path / "out.mp4")
+    rew_engine.reverse_file(path, output, mode, output_format="fmp4")
+
+    with open(output, "rb") as f:
+        assert b"moof" in f.read()
+    report = rew_verify.verify_files(path, output, mode)
+    assert report.ok, report.summary()
+
+
+@pytest.mark.parametrize("mode", rew_engine.MODES)
+def test_reverse_file_hls(tmp_path, mode):
+    path = _make_video(str(tmp_path / "src.mp4"), "-c:v", "libx264", "-pix_fmt", "yuv420p")
+    output = str(tmp_path / "out.m3u8")
+    rew_engine.reverse_file(path, output, mode, output_format="hls")
+
+    # init 片段依輸出檔名命名，媒體片段與播放清單放在同一資料夾
+    assert os.path.exists(tmp_path / "out_init.mp4")
+    assert list(tmp_path.glob("*.m4s"))
+    with open(output) as f:
+        assert "out_init.mp4" in f.read()
+    report = rew_verify.verify_files(path, output, mode)
+    assert report.ok, report.summary()
@@ -0,0 +1,74 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rew_planner
+from rew_planner import SourceInfo, SpeedInfo, plan_job
+
+GB = 1024 ** 3
+
+
+def _info(intra_only=False, gop=120, has_audio=False, duration=60.0):
+    return SourceInfo("in.mp4", "prores" if intra_only else "h264", (1920, 1080), 30.0, duration,
+                      1 if intra_only else gop, intra_only, has_audio)
+
+
+SPEEDS = SpeedInfo(decode_fps=300.0, encode_fps=120.0, spawn_seconds=0.05, audio_speed=40.0)
+
+
+@pytest.mark.parametrize("speed", [1.0, 4.0])
+def test_single_read_range_prefers_in_memory(speed):
+    # 只有一幀時兩種引擎策略都只需要一次讀取，分段串流不應該比較便宜
+    plan = plan_job(_info(), SPEEDS, 10, 10, "reverse", speed, memory_limit=8 * GB)
+    assert plan.estimates["segmented"].seconds >= plan.estimates["in_memory"].seconds
+    assert plan.choice == "in_memory"
+
+
+def test_short_high_speed_range_still_encodes():
+    # 3 幀 4 倍速仍會輸出 1 幀 (與 frame_order 的 ceil 相同)
+    plan = plan_job(_info(), SPEEDS, 0, 2, "reverse", 4.0, memory_limit=8 * GB)
+    spawn_and_decode = SPEEDS.spawn_seconds + 3 / SPEEDS.decode_fps
+    assert plan.estimates["in_memory"].seconds > spawn_and_decode
+
+
+def test_long_gop_picks_engine_over_moviepy():
+    # 長 GOP 時 MoviePy 每往回一幀都要從關鍵幀重新解碼
+    plan = plan_job(_info(gop=250), SPEEDS, mode="boomerang", memory_limit=64 * GB)
+    assert set(plan.estimates) == set(rew_planner.STRATEGIES)
+    assert plan.choice == "in_memory"
+    assert plan.estimates["moviepy"].seconds > plan.estimates["segmented"].seconds
+
+
+def test_memory_limit_excludes_in_memory():
+    info = _info()
+    full = plan_job(info, SPEEDS, memory_limit=64 * GB)
+    limit = (full.estimates["segmented"].memory + full.estimates["in_memory"].memory) / 2
+    plan = plan_job(info, SPEEDS, memory_limit=limit)
+    assert not plan.estimates["in_memory"].feasible
+    assert plan.estimates["segmented"].feasible
+    assert plan.choice == "segmented"
+
+
+def test_nothing_feasible_falls_back_to_fastest():
+    plan = plan_job(_info(), SPEEDS, memory_limit=1)
+    assert not any(est.feasible for est in plan.estimates.values())
+    assert plan.choice == min(plan.estimates.values(), key=lambda est: est.seconds).strategy
+
+
+@pytest.mark.parametrize("speed", [2.0, 4.0])
+def test_variable_speed_uses_engine_strategies_only(speed):
+    plan = plan_job(_info(), SPEEDS, mode="boomerang", speed=speed, strategies=rew_planner.ENGINE_STRATEGIES,
+                    memory_limit=64 * GB)
+    assert set(plan.estimates) == set(rew_planner.ENGINE_STRATEGIES)
+    assert plan.choice in rew_planner.ENGINE_STRATEGIES
+
+
+def test_audio_only_charged_at_original_speed():
+    info = _info(has_audio=True)
+    normal = plan_job(info, SPEEDS, speed=1.0, memory_limit=64 * GB)
+    silent = plan_job(_info(), SPEEDS, speed=1.0, memory_limit=64 * GB)
+    assert normal.estimates["in_memory"].seconds > silent.estimates["in_memory"].seconds
+    fast = plan_job(info, SPEEDS, speed=2.0, memory_limit=64 * GB)
+    fast_silent = plan_job(_info(), SPEEDS, speed=2.0, memory_limit=64 * GB)
+    assert fast.estimates["in_memory"].seconds == fast_silent.estimates["in_memory"].seconds
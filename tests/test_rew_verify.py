@@ -0,0 +1,73 @@
+import os
+import sys
+import numpy as np
+import pytest
+import imageio_ffmpeg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rew_engine
+import rew_verify
+
+
+@pytest.fixture(scope="module")
+def source():
+    # testsrc2 每一幀都有移動的圖案與計時數字，相鄰影格的雜湊可以區分
+    reader = imageio_ffmpeg.read_frames("testsrc2=size=160x120:rate=30:duration=2", input_params=["-f", "lavfi"])
+    w, h = next(reader)["size"]
+    return [np.frombuffer(buf, dtype=np.uint8).reshape(h, w, 3) for buf in reader]
+
+
+def _planned(source, mode="reverse", speed=1.0):
+    return [source[i] for i in rew_engine.frame_order(len(source), mode, speed)]
+
+
+@pytest.mark.parametrize("mode, speed, ease", [
+    ("reverse", 1.0, "linear"),
+    ("boomerang", 1.0, "linear"),
+    ("reverse", 4.0, "linear"),
+    ("boomerang", 2.0, "in_out"),
+])
+def test_engine_output_passes(source, mode, speed, ease):
+    frames = rew_engine.iter_frames(rew_engine.ArrayFrameSource(source), mode, segment_frames=8, speed=speed, ease=ease)
+    report = rew_verify.verify_frames(source, frames, mode, speed, ease)
+    assert report.ok, report.summary()
+    assert not report.duplicates and not report.gaps
+    assert report.seam_ok is (True if mode == "boomerang" else None)
+
+
+def test_dropped_frame(source):
+    output = _planned(source)
+    del output[10]
+    report = rew_verify.verify_frames(source, output)
+    assert not report.ok and not report.length_ok
+    assert report.gaps == [len(source) - 1 - 10]
+    assert report.mismatches[0] == 10
+
+
+def test_duplicated_frame(source):
+    output = _planned(source)
+    output[10] = output[9]
+    report = rew_verify.verify_frames(source, output)
+    assert not report.ok
+    assert report.duplicates == [10]
+    assert report.mismatches == [10]
+    assert report.gaps == [len(source) - 1 - 10]
+
+
+def test_swapped_frames(source):
+    output = _planned(source)
+    output[20], output[21] = output[21], output[20]
+    report = rew_verify.verify_frames(source, output)
+    assert not report.ok
+    assert report.mismatches == [20, 21]
+    assert not report.duplicates and not report.gaps
+
+
+def test_broken_boomerang_seam(source):
+    # 折返處少了重複的最後一幀 (正向的最後一幀直接接倒轉的倒數第二幀)
+    output = _planned(source, "boomerang")
+    del output[len(source)]
+    report = rew_verify.verify_frames(source, output, "boomerang")
+    assert not report.ok
+    assert report.seam_ok is False
+    assert report.mismatches[0] == len(source)